@@ -4,12 +4,74 @@
 """Simple interface to store/retreive objects from shelves."""
 
 import os
-import copy
+import zlib
+import functools
+import pickle
 import shelve
+import sqlite3
+import collections
+try:
+    from collections.abc import MutableMapping
+    from urllib.request import pathname2url
+except ImportError:  # python 2
+    from collections import MutableMapping
+    from urllib import pathname2url
+try:
+    import anydbm as dbm  # python 2
+    from whichdb import whichdb
+except ImportError:
+    import dbm
+    from dbm import whichdb
+try:
+    from compression import zstd  # python 3.14+
+except ImportError:
+    try:
+        import zstandard
+    except ImportError:
+        zstandard = None
+    zstd = None
 
 
 __version__ = '1.2'
 
+# Each record is stored under its own shelve key, each table keeps a
+# manifest mapping its keys to row ids, and a catalog lists the tables.
+# Row ids are never reused, so that a reader holding an older manifest can
+# not pick up another key's record:
+#   'C\x00'                   --> [table, ...]
+#   'N\x00'                   --> next row id
+#   'M\x00<table>'            --> {key: row id}
+#   'T\x00<table>\x00<row id>' --> object
+# Files written by older versions store each table as a single dict under
+# the table name; those are still read, and rewritten on their next save.
+_CATALOG = 'C\x00'
+_NEXT_ROW = 'N\x00'
+_MANIFEST = 'M\x00'
+_ROW = 'T\x00'
+
+
+def _row_key(table_name, row):
+    """return the shelve key of a record."""
+    return '%s%s\x00%d' % (_ROW, table_name, row)
+
+
+def _db_exists(filename, backend):
+    """return True if a database file exists for the given backend."""
+    if backend == 'sqlite':
+        return os.path.exists(filename)
+    # dbm modules may add their own extensions to the filename
+    return whichdb(filename) is not None
+
+
+def _zstd_codec():
+    """return the (compress, decompress) functions for zstd, or None."""
+    if zstd is not None:
+        return (lambda data: zstd.compress(data, 3), zstd.decompress)
+    if zstandard is not None:
+        return (zstandard.ZstdCompressor(level=3).compress,
+                zstandard.ZstdDecompressor().decompress)
+    return None
+
 
 ########################
 # Exceptions
@@ -45,11 +107,198 @@ class ReadOnlyDatabaseError(DBError):
     pass
 
 
+def _rw(fn):
+    """decorator refusing to run a method on a read-only DB."""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if self._ro:
+            raise ReadOnlyDatabaseError("Can't modify a read-only DB!!!")
+        return fn(self, *args, **kwargs)
+    return wrapper
+
+
+########################
+# SQLite storage
+########################
+
+class _SQLiteDict(MutableMapping):
+    """dbm-like mapping of keys to pickled blobs stored in a SQLite file.
+
+    The database runs in WAL mode and writes are only committed on sync(), so
+    a `SmallDB.save()` costs a single commit whatever the number of tables
+    written. Read-only connections never write to the file, so that readers
+    can run next to a writer.
+    """
+
+    def __init__(self, filename, flag='c'):
+        self.readonly = flag == 'r'
+        if self.readonly:
+            # read-only: nothing may be written, not even the WAL setup
+            if not os.path.exists(filename):
+                raise IOError("No such file: %s" % filename)
+            uri = 'file:%s?mode=ro' % pathname2url(os.path.abspath(filename))
+            if not os.path.exists(filename + '-wal'):
+                # no writer is connected: the file can be read as it is,
+                # without creating the -wal/-shm files WAL mode asks for.
+                uri += '&immutable=1'
+            try:
+                self.conn = sqlite3.connect(uri, uri=True)
+            except TypeError:  # python 2 has no uri support
+                self.conn = sqlite3.connect(filename)
+            return
+        self.conn = sqlite3.connect(filename)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS shelf "
+                          "(key BLOB PRIMARY KEY, value BLOB NOT NULL)")
+        self.conn.commit()
+
+    def __getitem__(self, key):
+        row = self.conn.execute("SELECT value FROM shelf WHERE key = ?",
+                                (sqlite3.Binary(key),)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return bytes(row[0])
+
+    def __setitem__(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO shelf (key, value) "
+                          "VALUES (?, ?)",
+                          (sqlite3.Binary(key), sqlite3.Binary(value)))
+
+    def __delitem__(self, key):
+        cursor = self.conn.execute("DELETE FROM shelf WHERE key = ?",
+                                   (sqlite3.Binary(key),))
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        row = self.conn.execute("SELECT 1 FROM shelf WHERE key = ?",
+                                (sqlite3.Binary(key),)).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        for row in self.conn.execute("SELECT key FROM shelf").fetchall():
+            yield bytes(row[0])
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM shelf").fetchone()[0]
+
+    def sync(self):
+        self.conn.commit()
+
+    def close(self):
+        try:
+            if not self.readonly:
+                self.conn.commit()
+        finally:
+            self.conn.close()
+
+
+class _CompressedShelf(shelve.Shelf):
+    """Shelf compressing the pickled values it stores.
+
+    writeback is not supported, values are always read from the underlying
+    mapping.
+    """
+
+    def __init__(self, store, compress, decompress, protocol=None):
+        shelve.Shelf.__init__(self, store, protocol, False)
+        self._compress = compress
+        self._decompress = decompress
+
+    def _store_key(self, key):
+        # python 3 shelves store encoded keys, python 2 ones store str
+        if hasattr(self, 'keyencoding'):
+            return key.encode(self.keyencoding)
+        return key
+
+    def __getitem__(self, key):
+        data = self.dict[self._store_key(key)]
+        return pickle.loads(self._decompress(data))
+
+    def __setitem__(self, key, value):
+        data = pickle.dumps(value, self._protocol)
+        self.dict[self._store_key(key)] = self._compress(data)
+
+
+########################
+# Tables
+########################
+
+class _Table(MutableMapping):
+    """Overlay of the changes made to a table stored in the shelve.
+
+    Records are only read from the shelve when accessed, and the changes made
+    since the last commit are kept aside so that `SmallDB.save()` only has to
+    write those. Keys keep the order of the committed manifest, followed by
+    the keys added since.
+    """
+
+    def __init__(self, shelf, table_name, manifest):
+        self.shelf = shelf
+        self.table_name = table_name
+        # {key: row id} as committed in the shelve
+        self.manifest = manifest
+        # committed keys removed since the last commit
+        self.removed = set()
+        # keys added since the last commit, in insertion order
+        self.added = collections.OrderedDict()
+        # keys whose record must be written on the next commit
+        self.dirty = set()
+        # records read or written so far
+        self.rows = dict()
+
+    def __contains__(self, key):
+        return key in self.added or (key in self.manifest and
+                                     key not in self.removed)
+
+    def __getitem__(self, key):
+        try:
+            return self.rows[key]
+        except KeyError:
+            pass
+        if key not in self:
+            raise KeyError(key)
+        try:
+            obj = self.shelf[_row_key(self.table_name, self.manifest[key])]
+        except KeyError:
+            # the manifest is older than the shelve: the record is gone
+            raise DBKeyError("%s not found in %s" % (key, self.table_name))
+        self.rows[key] = obj
+        return obj
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.added[key] = None
+        self.rows[key] = value
+        self.dirty.add(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.rows.pop(key, None)
+        self.dirty.discard(key)
+        if key in self.added:
+            del self.added[key]
+        else:
+            self.removed.add(key)
+
+    def __iter__(self):
+        for key in self.manifest:
+            if key not in self.removed:
+                yield key
+        for key in self.added:
+            yield key
+
+    def __len__(self):
+        return len(self.manifest) - len(self.removed) + len(self.added)
+
+
 ########################
 # SmallDB Class
 ########################
 
-class SmallDB:
+class SmallDB(object):
     """Interface to store and retreive data or objects from shelve db.
 
     A SmallDB object is basically a shelve that can store many dictionnaries.
@@ -59,6 +308,7 @@ class SmallDB:
     Data manipulation on `SmallDB` objects can be done through the following
     methods:
      insert:        insert records
+     insert_many:   insert many records at once
      update:        replace the value of an existing records
      add:           convinient method to update records
      append:        convinient method to update records
@@ -68,8 +318,10 @@ class SmallDB:
 
     The following methods are also provided to retreive data:
      select:        retreive records
-     get_tables:    retreive all tables from the object
-     get_keys:      retreive all keys from tables
+     tables:        iterate over all tables of the object
+     keys:          iterate over all keys of a table
+     list_tables:   retreive all tables as a list
+     list_keys:     retreive all keys of a table as a list
 
     a `SmallDB` object can be instantiated in two modes:
      - ro: read-only; all methods that try to modify data are not allowed
@@ -80,9 +332,27 @@ class SmallDB:
      Examples:
        - create a `SmallDB` object in ro mode: db = SmallDB(filename, 'ro')
        - create a `SmallDB` object in rw mode: db = SmallDB(filename, 'rw')
+
+    Data can be stored in two backends:
+     - dbm:    a regular shelve, using whichever dbm module is available
+     - sqlite: a shelve over a SQLite file in WAL mode, where each save() is
+               committed in a single transaction
+     ** The default backend is 'dbm'
+
+    Pickled objects can also be compressed before being stored:
+     - none: objects are stored as they are pickled
+     - zlib: objects are compressed with zlib
+     - zstd: objects are compressed with zstd; needs python 3.14+ or the
+             `zstandard` package
+     ** The default compression is 'none'. A file must always be opened with
+        the compression it was written with.
     """
 
-    def __init__(self, dbf=None, mode='rw'):
+    __slots__ = ('mode', '_ro', 'dbfile', 'backend', 'compression', '_codec',
+                 'db', 'db_ref', 'log', '_read_cache', '_cache_len',
+                 '_cache_max', '_manifests', '_tables', '__weakref__')
+
+    def __init__(self, dbf=None, mode='rw', backend='dbm', compression='none'):
         """Constructor: Creates a new `SmallDB` object
 
         @param dbf: a filename where data will be saved.
@@ -90,36 +360,196 @@ class SmallDB:
                     'ro':   read-only  --> no data can be added
                     'rw':   read-write --> data manipilation is allowed
                     Default mode is 'rw'
+        @param backend: storage used for the file
+                    'dbm':    shelve over the default dbm module
+                    'sqlite': shelve over a SQLite database
+                    Default backend is 'dbm'
+        @param compression: compression of the pickled objects
+                    'none', 'zlib' or 'zstd'
+                    Default compression is 'none'
         """
         if mode != 'ro' and mode != 'rw':
             raise DBInitializationError("Wrong mode!!!")
         else:
             self.mode = mode
+        if backend != 'dbm' and backend != 'sqlite':
+            raise DBInitializationError("Wrong backend!!!")
+        self.backend = backend
+        if compression == 'none':
+            self._codec = None
+        elif compression == 'zlib':
+            self._codec = (zlib.compress, zlib.decompress)
+        elif compression == 'zstd':
+            self._codec = _zstd_codec()
+            if self._codec is None:
+                raise DBInitializationError("zstd compression is not available")
+        else:
+            raise DBInitializationError("Wrong compression!!!")
+        self.compression = compression
+        self._ro = mode == 'ro'
         self.dbfile = dbf
+        # table_name -> {key: object}, for records read from the shelve;
+        # tables and records are kept from least to most recently read
+        self._read_cache = collections.OrderedDict()
+        # number of records in the read cache
+        self._cache_len = 0
+        # maximum number of records kept in the read cache
+        self._cache_max = 1024
+        # table_name -> {key: row id}, as committed in the shelve
+        self._manifests = dict()
+        # tables committed in the shelve, read from the catalog on demand
+        self._tables = None
         self.__open__()
 
     def __open__(self):
         if self.dbfile is not None:
+            # writeback stays off: with it, every record read would be kept
+            # in memory and re-pickled on each sync.
+            flag = 'r' if self._ro else 'c'
             try:
-                self.db = shelve.open(self.dbfile)
-                self.db_ref = dict()
-                for key in self.db:
-                    self.db_ref[key] = self.db[key]
+                if self.backend == 'sqlite':
+                    store = _SQLiteDict(self.dbfile, flag)
+                else:
+                    store = dbm.open(self.dbfile, flag)
+                if self._codec is None:
+                    self.db = shelve.Shelf(store,
+                                           protocol=pickle.HIGHEST_PROTOCOL,
+                                           writeback=False)
+                else:
+                    self.db = _CompressedShelf(store, self._codec[0],
+                                               self._codec[1],
+                                               pickle.HIGHEST_PROTOCOL)
             except Exception as e:
-                raise DBInitializationError("Could not open db file - {0:s}: {1:s}".format(self.dbfile, e))
+                raise DBInitializationError("Could not open db file - {0:s}: {1!s}".format(self.dbfile, e))
         else:
             raise DBInitializationError('DB filename missing.')
+        # tables are read from the shelve on demand; db_ref only holds the
+        # tables that were modified since the last commit, as _Table
+        # overlays for the tables already stored.
+        self.db_ref = dict()
         self.log = dict()
-        if self.mode == 'ro':
-            self.db.close()
 
+    def _get_table(self, table_name):
+        """return a table, looking at local changes first, then the shelve.
+
+        @param table_name: table
+        """
+        try:
+            return self.db_ref[table_name]
+        except KeyError:
+            pass
+        if table_name in self.log:
+            # removed since the last commit
+            raise TableReferenceError("%s is not in DB." % table_name)
+        manifest = self._manifest(table_name)
+        if manifest is not None:
+            return _Table(self.db, table_name, manifest)
+        try:
+            return self.db[table_name]
+        except KeyError:
+            raise TableReferenceError("%s is not in DB." % table_name)
+
+    def _has_table(self, table_name):
+        """return True if a table exists, without loading its records.
+
+        @param table_name: table
+        """
+        if table_name in self.db_ref:
+            return True
+        if table_name in self.log:
+            return False
+        return table_name in self._catalog()
+
+    def _catalog(self):
+        """return the list of tables committed in the shelve."""
+        if self._tables is None:
+            try:
+                self._tables = self.db[_CATALOG]
+            except KeyError:
+                # no catalog yet: an empty file or one written by an older
+                # version, where every key is a table.
+                self._tables = list()
+                for key in self.db:
+                    if key.startswith(_ROW) or key == _NEXT_ROW:
+                        continue
+                    if key.startswith(_MANIFEST):
+                        key = key[len(_MANIFEST):]
+                    if key not in self._tables:
+                        self._tables.append(key)
+        return self._tables
+
+    def _manifest(self, table_name):
+        """return the committed {key: row id} manifest of a table.
+
+        None is returned when the table has no manifest in the shelve.
+
+        @param table_name: table
+        """
+        try:
+            return self._manifests[table_name]
+        except KeyError:
+            pass
+        try:
+            manifest = self.db[_MANIFEST + table_name]
+        except KeyError:
+            return None
+        self._manifests[table_name] = manifest
+        return manifest
+
+    def _read_record(self, table_name, key):
+        """read one record, only loading that record from the shelve.
+
+        @param table_name: table
+        @param key:        key
+        """
+        table = self.db_ref.get(table_name)
+        if table is None and table_name not in self.log:
+            manifest = self._manifest(table_name)
+            if manifest is not None:
+                try:
+                    row = manifest[key]
+                except KeyError:
+                    raise DBKeyError("%s not found in %s" % (key, table_name))
+                try:
+                    return self.db[_row_key(table_name, row)]
+                except KeyError:
+                    # the manifest is older than the shelve
+                    raise DBKeyError("%s not found in %s" % (key, table_name))
+        if table is None:
+            table = self._get_table(table_name)
+        try:
+            return table[key]
+        except KeyError:
+            raise DBKeyError("%s not found in %s" % (key, table_name))
+
+    def _touch_table(self, table_name):
+        """return a table for modification, copying it to db_ref on first
+        touch.
+
+        @param table_name: table
+        """
+        try:
+            return self.db_ref[table_name]
+        except KeyError:
+            table = self._get_table(table_name)
+            self._invalidate(table_name)
+            self.db_ref[table_name] = table
+            return table
+
+    def _invalidate(self, table_name):
+        """drop the cached records of a table.
+
+        @param table_name: table
+        """
+        self._cache_len -= len(self._read_cache.pop(table_name, ()))
+
+    @_rw
     def create_table(self, table_name):
         """create a table in db.
 
         @param table_name: name to assign to the table
         """
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Can't modify a read-only DB!!!")
+        self._invalidate(table_name)
         self.db_ref[table_name] = dict()
         self.log[table_name] = ''
 
@@ -129,25 +559,33 @@ class SmallDB:
         @param table_name: table
         @param key:        key to search the object
         """
-        if key is not None:
-            try:
-                table = self.db_ref[table_name]
-            except KeyError:
-                raise TableReferenceError("%s is not in DB." % table_name)
-            try:
-                return table[key]
-            except KeyError:
-                raise DBKeyError("%s not found in %s" % (key, table_name))
+        if key is None:
+            return list(self._get_table(table_name).values())
+        records = self._read_cache.get(table_name)
+        if records is not None and key in records:
+            obj = records.pop(key)
+            self._cache_len -= 1
         else:
-            try:
-                table = self.db_ref[table_name]
-            except KeyError:
-                raise TableReferenceError("%s is not in DB." % table_name)
-            data = list()
-            for key in table:
-                data.append(table[key])
-            return data
-
+            obj = self._read_record(table_name, key)
+            if table_name in self.db_ref:
+                # modified since the last commit, not worth caching
+                return obj
+            if records is None:
+                records = collections.OrderedDict()
+        self._read_cache[table_name] = self._read_cache.pop(table_name,
+                                                            records)
+        records[key] = obj
+        self._cache_len += 1
+        if self._cache_len > self._cache_max:
+            # evict the oldest record of the least recently read table
+            oldest = next(iter(self._read_cache))
+            self._read_cache[oldest].popitem(last=False)
+            self._cache_len -= 1
+            if not self._read_cache[oldest]:
+                del self._read_cache[oldest]
+        return obj
+
+    @_rw
     def insert(self, table_name, key, obj):
         """insert an object in a table.
 
@@ -155,42 +593,79 @@ class SmallDB:
         @param key:        key
         @param obj:        the object to insert
         """
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Can't modify a read-only DB!!!")
         try:
-            table = self.db_ref[table_name]
-        except KeyError:
-            self.create_table(table_name)
-            self.insert(table_name, key, obj)
-            return
-        try:
-            data = table[key]
-            del data
-        except KeyError:
-            table[key] = obj
-            self.db_ref[table_name] = table
-        else:
+            table = self._touch_table(table_name)
+        except TableReferenceError:
+            table = self.db_ref[table_name] = dict()
+        if key in table:
             raise DuplicateKeyError("key [%s] exists in table [%s]" % (
                 key, table_name))
+        table[key] = obj
         self.log[table_name] = ''
 
-    def keys(self, table_name):
-        """return all keys associated with a table
+    @_rw
+    def insert_many(self, table_name, items):
+        """insert many objects in a table at once.
 
         @param table_name: table
+        @param items:      iterable of (key, obj) pairs to insert
         """
+        items = list(items)
         try:
-            return self.db_ref[table_name].keys()
-        except KeyError:
-            raise TableReferenceError("%s is not in DB." % table_name)
+            table = self._touch_table(table_name)
+        except TableReferenceError:
+            table = dict()
+        seen = set()
+        dup = list()
+        for key, _ in items:
+            if key in table or key in seen:
+                dup.append(key)
+            seen.add(key)
+        if dup:
+            raise DuplicateKeyError("keys %s exist in table [%s]" % (
+                dup, table_name))
+        table.update(items)
+        self.db_ref[table_name] = table
+        self.log[table_name] = ''
+
+    def keys(self, table_name):
+        """return an iterator over the keys associated with a table
+
+        The table must not be modified while iterating, use list_keys() for
+        that.
+
+        @param table_name: table
+        """
+        if table_name not in self.db_ref and table_name not in self.log:
+            manifest = self._manifest(table_name)
+            if manifest is not None:
+                return iter(manifest)
+        return iter(self._get_table(table_name))
+
+    def list_keys(self, table_name):
+        """return all keys associated with a table as a list
+
+        @param table_name: table
+        """
+        return list(self.keys(table_name))
 
     def tables(self):
-        """return all tables
+        """return an iterator over all tables
 
-        Keyword arguments:
+        Tables must not be created or removed while iterating, use
+        list_tables() for that.
         """
-        return self.db_ref.keys()
+        for table_name in self.db_ref:
+            yield table_name
+        for table_name in self._catalog():
+            if table_name not in self.db_ref and table_name not in self.log:
+                yield table_name
+
+    def list_tables(self):
+        """return all tables as a list"""
+        return list(self.tables())
 
+    @_rw
     def update(self, table_name, key, obj):
         """update an object in a table.
 
@@ -198,113 +673,155 @@ class SmallDB:
         @param key:        key
         @param obj:        the object to update
         """
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Can't modify a read-only DB!!!")
-        try:
-            table = self.db_ref[table_name]
-        except KeyError:
-            raise TableReferenceError("%s is not in DB." % table_name)
-        try:
-            table[key] = obj
-            self.db_ref[table_name] = table
-        except KeyError:
-            raise DBKeyError("%s not found in %s" % (key, table_name))
+        table = self._touch_table(table_name)
+        table[key] = obj
         self.log[table_name] = ''
 
+    @_rw
     def append(self, table_name, key, obj):
         """append an object to an existing object in a talbe.
-        the object we append to must have a append() method, otherwise an
-        exception will be raised.
+        the object we append to must have a append() method, otherwise a
+        DBError exception will be raised.
 
         @param table_name: table
         @param key:        key
         @param obj:        the object to append to the selected object
         """
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Can't modify a read-only DB!!!")
-        try:
-            tmp_obj = self.select(table_name, key)
-            tmp_obj.append(obj)
-            self.update(table_name, key, tmp_obj)
-        except DBKeyError:
+        table = self._touch_table(table_name)
+        if key not in table:
             raise DBKeyError("%s not found in %s" % (key, table_name))
-        except TableReferenceError:
-            raise TableReferenceError("%s is not in DB." % table_name)
-        except AttributeError, e:
-            print e
+        value = table[key]
+        try:
+            value.append(obj)
+        except AttributeError as e:
+            raise DBError("object in %s/%s does not support append: %s" % (
+                table_name, key, e))
+        # store it back so that the record is written on the next commit
+        table[key] = value
         self.log[table_name] = ''
 
+    @_rw
     def add(self, table_name, key, obj):
         """add an object to un existing object in a talbe.
-        the object we add to must support the + operator, otherwise an
-        exception will be raised.
+        the object we add to must support the + operator, otherwise a
+        DBError exception will be raised.
 
         @param table_name: table
         @param key:        key
         @param obj:        the object to add to the selected object
         """
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Can't modify a read-only DB!!!")
-        try:
-            tmp_obj = self.select(table_name, key)
-            tmp_obj += obj
-            self.update(table_name, key, tmp_obj)
-        except DBKeyError:
+        table = self._touch_table(table_name)
+        if key not in table:
             raise DBKeyError("%s not found in %s" % (key, table_name))
-        except TableReferenceError:
-            raise TableReferenceError("%s is not in DB." % table_name)
-        except AttributeError, e:
-            print e
+        # += may rebind the value (int, str, tuple...), so store it back.
+        try:
+            table[key] += obj
+        except TypeError as e:
+            raise DBError("object in %s/%s does not support +: %s" % (
+                table_name, key, e))
         self.log[table_name] = ''
 
+    @_rw
     def remove(self, table_name, key):
         """remove an object from a table.
 
         @param table_name: table
         @param key:        key
         """
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Can't modify a read-only DB!!!")
-        try:
-            table = self.db_ref[table_name]
-        except KeyError:
-            raise TableReferenceError("%s is not in DB." % table_name)
+        table = self._touch_table(table_name)
         try:
             del table[key]
-            self.db_ref[table_name] = table
         except KeyError:
             raise DBKeyError("%s not found in %s" % (key, table_name))
         self.log[table_name] = ''
 
+    @_rw
     def remove_table(self, table_name):
         """remove a table from the db.
 
         @param table_name: table to remove.
         """
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Can't modify a read-only DB!!!")
-        try:
-            del self.db_ref[table_name]
-        except KeyError:
+        if not self._has_table(table_name):
             raise TableReferenceError("%s is not in DB." % table_name)
+        self._invalidate(table_name)
+        self.db_ref.pop(table_name, None)
         self.log[table_name] = ''
 
     def save(self):
-        """save changes made after the last commit."""
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Can't commit on a read-only DB!!!")
-        for key in self.db:
-            if key in self.log and key not in self.db_ref:
-                del self.db[key]
-                del self.log[key]
-        for key in self.log:
-            self.db[key] = self.db_ref[key]
+        """save changes made after the last commit.
+
+        Only the records modified since the last commit are written, along
+        with the manifests of the tables whose keys changed.
+        """
+        if self._ro:
+            return  # nothing can have changed on a read-only DB
+        pending_delete = list()
+        pending_write = dict()
+        catalog = list(self._catalog())
+        first_row = next_row = self.db.get(_NEXT_ROW, 0)
+        for table_name in self.log:
+            table = self.db_ref.get(table_name)
+            stored = self._manifest(table_name)
+            exists = stored is not None
+            if not exists:
+                stored = dict()
+                if table_name in self.db:
+                    # saved by an older version as a single dict
+                    pending_delete.append(table_name)
+            if table is None:
+                for row in stored.values():
+                    pending_delete.append(_row_key(table_name, row))
+                if exists:
+                    pending_delete.append(_MANIFEST + table_name)
+                self._manifests.pop(table_name, None)
+                if table_name in catalog:
+                    catalog.remove(table_name)
+                continue
+            if table_name not in catalog:
+                catalog.append(table_name)
+            if isinstance(table, _Table):
+                base, added, dirty = table.manifest, table.added, table.dirty
+            else:
+                # created since the last commit or saved by an older version:
+                # every record is new
+                base, added, dirty = dict(), table, ()
+            if stored:
+                # files saved before the row counter existed
+                next_row = max(next_row, max(stored.values()) + 1)
+            manifest = dict()
+            for key in table:
+                if key in base and key not in added:
+                    row = manifest[key] = base[key]
+                    if key not in dirty:
+                        continue
+                else:
+                    row = manifest[key] = next_row
+                    next_row += 1
+                pending_write[_row_key(table_name, row)] = table[key]
+            for key, row in stored.items():
+                if manifest.get(key) != row:
+                    pending_delete.append(_row_key(table_name, row))
+            if not exists or manifest != stored:
+                pending_write[_MANIFEST + table_name] = manifest
+            self._manifests[table_name] = manifest
+        if catalog != self._tables or _CATALOG not in self.db:
+            pending_write[_CATALOG] = catalog
+        self._tables = catalog
+        if next_row != first_row:
+            pending_write[_NEXT_ROW] = next_row
+        for key in pending_delete:
+            del self.db[key]
+        self.db.update(pending_write)
+        self.db.sync()
+        self.log = dict()
+        self.db_ref = dict()
 
+    @_rw
     def drop(self):
         """drop changed made after the last commit."""
-        if self.mode == 'ro':
-            raise ReadOnlyDatabaseError("Nothing to drop on a read-only DB!!!")
-        self.__init__(self.dbfile)
+        # committed data is still in the shelve, only forget local changes.
+        self.db_ref.clear()
+        self.log.clear()
 
     def print_db(self, table_name=None, key=None):
         """print contents of database.
@@ -316,62 +833,42 @@ class SmallDB:
                            printed
         """
         if table_name is None:
-            for table in self.db_ref:
-                try:
-                    title = table
-                except DBKeyError:
-                    title = table
-                except TableReferenceError:
-                    title = table
-                print "*" * (len(title) + 4)
-                print "* %s *" % title
-                print "*" * (len(title) + 4)
-                print "%s\t\t\t\t%-.80s" % ('key', 'data')
-                print ("-" * 100)
-                if key is None:
-                    for k in self.db_ref[table]:
-                        print "%s\t\t\t\t%-.80s" % (k, self.select(
-                            table, k))
-                else:
-                    try:
-                        print "%s\t\t\t\t%-.80s" % (key, self.select(
-                            table, key))
-                    except DBKeyError:
-                        print "No data was found"
-                print "\n"
+            for table in self.tables():
+                self._print_table(table, key, '\n')
         else:
             try:
-                data = self.db_ref[table_name]
-                del data
-            except KeyError:
-                print "%s not in Database." % table_name
-                return
-            title = table_name
-            print "*" * (len(title) + 4)
-            print "* %s *" % title
-            print "*" * (len(title) + 4)
-            print "%s\t\t\t\t%-.80s" % ('key', 'data')
-            print ("-" * 100)
-            if key is None:
-                for k in self.db_ref[table_name]:
-                    print "%s\t\t\t\t%-.80s" % (k, self.select(
-                        table_name, k))
-            else:
-                try:
-                    print "%s\t\t\t\t%-.80s" % (key, self.select(
-                        table_name, key))
-                except DBKeyError:
-                    print "No data was found"
-            print
+                self._print_table(table_name, key)
+            except TableReferenceError:
+                print("%s not in Database." % table_name)
+
+    def _print_table(self, table_name, key=None, end=''):
+        """print the contents of one table in a single write.
+
+        @param table_name: table to print.
+        @param key:        key of data to print.
+                           *if ommitted, all data of the table will be printed
+        @param end:        extra text printed after the table.
+        """
+        table = self._get_table(table_name)
+        border = "*" * (len(table_name) + 4)
+        lines = [border, "* %s *" % table_name, border,
+                 "%s\t\t\t\t%-.80s" % ('key', 'data'), "-" * 100]
+        if key is None:
+            for k, v in table.items():
+                lines.append("%s\t\t\t\t%-.80s" % (k, v))
+        elif key in table:
+            lines.append("%s\t\t\t\t%-.80s" % (key, table[key]))
+        else:
+            lines.append("No data was found")
+        lines.append(end)
+        print("\n".join(lines))
 
     def close(self):
         """save changes after the last commit and close db.
 
         No data manipulation can be done after calling on close().
         """
-        if self.mode == 'ro':
-            pass  # Let's allow this at least.
-        if len(self.log) != 0:
+        if not self._ro and len(self.log) != 0:
             self.save()
         self.db.close()
 
@@ -387,11 +884,13 @@ class MemDB(SmallDB):
     as a `SmallDB`, except everything is done on memmory. There is no way to
     persistently save date on disk.
     When a filename(dbf) is provided to the constructor, a `MemDB` object will
-    replicate the database contained in the provided file, otherwise an empty
-    database is returned.
+    replicate the database contained in the provided file, otherwise, or when
+    the file does not exist yet, an empty database is returned.
     """
 
-    def __init__(self, dbf=None, mode='rw'):
+    __slots__ = ()
+
+    def __init__(self, dbf=None, mode='rw', backend='dbm', compression='none'):
         """Constructor: Creates a new MemDB object
 
         @param dbf:  a filename from where to replicate database.
@@ -399,17 +898,31 @@ class MemDB(SmallDB):
                      'ro':   read-only  --> no data can be added
                      'rw':   read-write --> data manipilation is allowed
                      Default mode is 'rw'
+        @param backend: storage of the file to replicate from/to
+                     'dbm' or 'sqlite', see `SmallDB`
+                     Default backend is 'dbm'
+        @param compression: compression of the file to replicate from/to
+                     'none', 'zlib' or 'zstd', see `SmallDB`
+                     Default compression is 'none'
         """
-        SmallDB.__init__(self, dbf, mode)
+        SmallDB.__init__(self, dbf, mode, backend, compression)
 
     def __open__(self):
-        if self.dbfile is not None:
-            small_db = SmallDB(self.dbfile)
-            self.db_ref = copy.deepcopy(small_db.db_ref)
+        if self.dbfile is not None and _db_exists(self.dbfile, self.backend):
+            # tables read from a shelve are freshly unpickled copies, so they
+            # can be taken over as they are.
+            small_db = SmallDB(self.dbfile, 'ro', self.backend,
+                               self.compression)
+            self.db_ref = dict()
+            for table_name in small_db.tables():
+                self.db_ref[table_name] = dict(
+                    small_db._get_table(table_name))
             small_db.close()
             del small_db
         else:
             self.db_ref = dict()
+        # no shelve backs a MemDB, everything lives in db_ref
+        self.db = dict()
         self.log = dict()
 
     def replicate_from_smalldb(self, dbf=None):
@@ -418,22 +931,32 @@ class MemDB(SmallDB):
         @param dbf:  a filename from where to replicate database.
         """
         if dbf is None and self.dbfile is not None:
-            self.__init__(self.dbfile)
+            self.__init__(self.dbfile, backend=self.backend,
+                          compression=self.compression)
         else:
-            self.__init__(dbf)
+            self.__init__(dbf, backend=self.backend,
+                          compression=self.compression)
 
     def replicate_to_smalldb(self, dbf=None):
         """Copy back contents of the `MemDB` to a `SmallDB`
 
+        Only the tables changed since the database was replicated are written
+        back to its own file, while every table is written to another file.
+
         @param dbf:  a filename to replicate database.
         """
-        if dbf is not None:
-            smalldb = SmallDB(dbf)
+        if dbf is None or dbf == self.dbfile:
+            dbf = self.dbfile
+            tables = self.log
         else:
-            smalldb = SmallDB(self.dbfile)
-
-        smalldb.db_ref = copy.deepcopy(self.db_ref)
-        smalldb.log = copy.deepcopy(self.log)
+            tables = set(self.log).union(self.db_ref)
+        smalldb = SmallDB(dbf, backend=self.backend,
+                          compression=self.compression)
+        # save() only reads the tables and rebinds db_ref afterwards, so
+        # they can be shared: each record is pickled once, straight from
+        # this object.
+        smalldb.db_ref = self.db_ref
+        smalldb.log = dict.fromkeys(tables, '')
         smalldb.save()
         smalldb.close()
         del smalldb
@@ -442,6 +965,12 @@ class MemDB(SmallDB):
         """This will do nothing, saving data is not supported"""
         pass
 
+    @_rw
+    def drop(self):
+        """drop all changes by replicating the database again."""
+        self.__init__(self.dbfile, backend=self.backend,
+                      compression=self.compression)
+
     def close(self):
         """This will do nothing, no shelve is associated"""
         pass
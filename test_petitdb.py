@@ -0,0 +1,162 @@
+import os
+import shelve
+import shutil
+import tempfile
+import unittest
+
+from petitdb import SmallDB, MemDB, DBKeyError, TableReferenceError
+from petitdb import _SQLiteDict
+
+
+class LayoutTests(object):
+    """storage layout tests, run against each backend."""
+
+    backend = None
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dbfile = os.path.join(self.dir, 'db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def open(self, dbf=None, mode='rw'):
+        return SmallDB(dbf or self.dbfile, mode, backend=self.backend)
+
+    def rows(self, db, table_name):
+        prefix = 'T\x00%s\x00' % table_name
+        return sorted(k for k in db.db if k.startswith(prefix))
+
+    def test_legacy_file_is_migrated(self):
+        if self.backend == 'sqlite':
+            store = shelve.Shelf(_SQLiteDict(self.dbfile))
+        else:
+            store = shelve.open(self.dbfile)
+        store['legacy'] = {'a': 1, 'b': 2}
+        store.close()
+        db = self.open()
+        self.assertEqual(db.list_tables(), ['legacy'])
+        self.assertEqual(db.select('legacy', 'a'), 1)
+        db.insert('legacy', 'c', 3)
+        db.save()
+        self.assertNotIn('legacy', db.db)
+        self.assertEqual(len(self.rows(db, 'legacy')), 3)
+        db.close()
+        db = self.open()
+        self.assertEqual(db.list_tables(), ['legacy'])
+        self.assertEqual(sorted(db.select('legacy')), [1, 2, 3])
+        db.close()
+
+    def test_remove_and_reinsert_across_saves(self):
+        db = self.open()
+        db.create_table('t')
+        db.insert_many('t', [('a', 1), ('b', 2), ('c', 3)])
+        db.save()
+        db.remove('t', 'b')
+        db.save()
+        self.assertEqual(len(self.rows(db, 't')), 2)
+        db.insert('t', 'b', 20)
+        db.update('t', 'a', 10)
+        db.save()
+        db.close()
+        db = self.open()
+        self.assertEqual(sorted(db.list_keys('t')), ['a', 'b', 'c'])
+        self.assertEqual(db.select('t', 'a'), 10)
+        self.assertEqual(db.select('t', 'b'), 20)
+        self.assertEqual(len(self.rows(db, 't')), 3)
+        db.close()
+
+    def test_remove_table_then_create_table(self):
+        db = self.open()
+        db.create_table('t')
+        db.insert('t', 'a', 1)
+        db.save()
+        old_rows = self.rows(db, 't')
+        db.remove_table('t')
+        db.create_table('t')
+        db.insert('t', 'x', 2)
+        db.save()
+        db.close()
+        db = self.open()
+        self.assertEqual(db.list_tables(), ['t'])
+        self.assertEqual(db.list_keys('t'), ['x'])
+        self.assertRaises(DBKeyError, db.select, 't', 'a')
+        # row ids are never reused
+        self.assertFalse(set(old_rows) & set(self.rows(db, 't')))
+        db.remove_table('t')
+        db.save()
+        self.assertEqual(db.list_tables(), [])
+        self.assertEqual(self.rows(db, 't'), [])
+        db.close()
+
+    def test_drop(self):
+        db = self.open()
+        db.create_table('t')
+        db.insert('t', 'a', 1)
+        db.save()
+        db.insert('t', 'b', 2)
+        db.remove('t', 'a')
+        db.create_table('u')
+        db.drop()
+        self.assertEqual(db.list_tables(), ['t'])
+        self.assertEqual(db.select('t', 'a'), 1)
+        self.assertRaises(DBKeyError, db.select, 't', 'b')
+        self.assertRaises(TableReferenceError, db.select, 'u', 'a')
+        db.close()
+
+    def test_memdb_replicate_to_smalldb(self):
+        db = self.open()
+        db.create_table('t')
+        db.insert('t', 'a', 1)
+        db.save()
+        db.close()
+        mem = MemDB(self.dbfile, backend=self.backend)
+        mem.insert('t', 'b', 2)
+        mem.create_table('u')
+        mem.insert('u', 'c', 3)
+        mem.replicate_to_smalldb()
+        other = os.path.join(self.dir, 'other')
+        mem.replicate_to_smalldb(other)
+        for dbf in (self.dbfile, other):
+            db = self.open(dbf)
+            self.assertEqual(sorted(db.list_tables()), ['t', 'u'])
+            self.assertEqual(sorted(db.select('t')), [1, 2])
+            self.assertEqual(db.select('u', 'c'), 3)
+            self.assertIn('C\x00', db.db)
+            self.assertEqual(len(self.rows(db, 't')), 2)
+            db.close()
+
+    def test_memdb_missing_file(self):
+        mem = MemDB(os.path.join(self.dir, 'missing'), backend=self.backend)
+        self.assertEqual(mem.list_tables(), [])
+
+
+class DbmLayoutTest(LayoutTests, unittest.TestCase):
+    backend = 'dbm'
+
+
+class SQLiteLayoutTest(LayoutTests, unittest.TestCase):
+    backend = 'sqlite'
+
+    def test_stale_reader(self):
+        writer = self.open()
+        writer.create_table('t')
+        writer.insert('t', 'a', 'A')
+        writer.insert('t', 'b', 'B')
+        writer.save()
+        reader = self.open(mode='ro')
+        self.assertEqual(reader.select('t', 'b'), 'B')
+        writer.remove_table('t')
+        writer.save()
+        writer.create_table('t')
+        writer.insert('t', 'x', 'X')
+        writer.insert('t', 'y', 'Y')
+        writer.save()
+        # the reader still holds the manifest it read first
+        self.assertRaises(DBKeyError, reader.select, 't', 'a')
+        reader.close()
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()